@@ -108,6 +108,22 @@ def get_rag():
     return _rag_instance
 
 
+def warmup_rag():
+    """Carga modelo de embeddings + pool de Postgres al arrancar, no en la 1ª petición."""
+    rag = get_rag()
+    if rag is None:
+        return
+    try:
+        rag.warmup()
+    except Exception as e:
+        logger.warning(f"No se pudo completar el warmup del RAG: {e}")
+
+
+# gunicorn importa app:app → el warmup corre una vez por worker al iniciar
+if os.getenv("PRELOAD_RAG_ON_STARTUP", "false").lower() == "true":
+    warmup_rag()
+
+
 # ---------------------------------------------------------------------
 # ROUTES
 # ---------------------------------------------------------------------
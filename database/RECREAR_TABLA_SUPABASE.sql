@@ -19,11 +19,13 @@ CREATE TABLE IF NOT EXISTS vecs.arbot_documents (
     metadata JSONB                -- Metadatos (title, chapter, article, page, keywords, etc.)
 );
 
--- Paso 3: Crear índice vectorial para búsquedas eficientes (ivfflat)
-CREATE INDEX IF NOT EXISTS arbot_documents_vec_idx 
+-- Paso 3: Crear índice vectorial para búsquedas eficientes (HNSW)
+-- La búsqueda usa <=> (distancia coseno), así que el op-class debe ser
+-- vector_cosine_ops (correcto tanto con embeddings normalizados como sin normalizar)
+CREATE INDEX IF NOT EXISTS arbot_documents_vec_hnsw_cos 
 ON vecs.arbot_documents 
-USING ivfflat (vec vector_cosine_ops)
-WITH (lists = 100);
+USING hnsw (vec vector_cosine_ops)
+WITH (m = 16, ef_construction = 64);
 
 -- Paso 4: Crear índice GIN para búsquedas en metadata JSONB
 CREATE INDEX IF NOT EXISTS arbot_documents_metadata_idx 
@@ -61,7 +63,7 @@ AND tablename = 'arbot_documents';
 --    - metadata: JSONB (Metadatos: title, chapter, article, page, keywords, etc.)
 --
 -- ✅ Índices creados:
---    - Vectorial (ivfflat) para búsquedas por similitud
+--    - Vectorial (HNSW, vector_cosine_ops) para búsquedas por similitud
 --    - GIN en metadata para búsquedas por artículo/título/capítulo
 --    - GIN en content para búsquedas de texto completo
 --
@@ -9,6 +9,9 @@ import requests
 import os
 from typing import Optional, Dict, Any
 
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 logger = logging.getLogger("services.api_model")
 
 
@@ -21,6 +24,7 @@ class APIModel:
         self.api_key = api_key or self._get_api_key()
 
         self.base_url = self._get_base_url()
+        self._http = self._build_session()
 
         logger.info(f"🧠 APIModel inicializado: provider={self.provider}, model={self.model_name}")
 
@@ -51,6 +55,27 @@ class APIModel:
         }
         return urls.get(self.provider)
 
+    def _build_session(self) -> requests.Session:
+        """
+        Sesión HTTP reutilizable: mantiene vivas las conexiones TCP/TLS con el
+        proveedor en lugar de abrir una nueva por pregunta.
+        Los reintentos solo cubren fallos de conexión (un POST no se repite
+        si el servidor ya lo recibió).
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=20,
+            max_retries=Retry(total=3, backoff_factor=0.2),
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        # Gemini autentica por query param (?key=); el resto con Bearer
+        if self.api_key and self.provider in ("groq", "huggingface"):
+            session.headers["Authorization"] = f"Bearer {self.api_key}"
+        return session
+
     # -------------------------------------------------------------
     # GENERATE (ENTRADA PRINCIPAL)
     # -------------------------------------------------------------
@@ -111,11 +136,6 @@ class APIModel:
         if not self.api_key:
             raise RuntimeError("GROQ_API_KEY faltante.")
 
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
-
         payload = {
             "model": self.model_name,
             "messages": [
@@ -127,10 +147,9 @@ class APIModel:
         }
 
         try:
-            response = requests.post(
+            response = self._http.post(
                 self.base_url,
                 json=payload,
-                headers=headers,
                 timeout=25
             )
         except Exception as e:
@@ -150,7 +169,6 @@ class APIModel:
     # -------------------------------------------------------------
     def _generate_huggingface(self, prompt: str, max_tokens: int, temperature: float) -> str:
         url = f"{self.base_url}/{self.model_name}"
-        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
 
         payload = {
             "inputs": prompt,
@@ -162,7 +180,7 @@ class APIModel:
         }
 
         try:
-            r = requests.post(url, json=payload, headers=headers, timeout=45)
+            r = self._http.post(url, json=payload, timeout=45)
         except Exception as e:
             logger.error(f"HF connection error: {e}")
             return ""
@@ -196,7 +214,7 @@ class APIModel:
         }
 
         try:
-            r = requests.post(url, params={"key": self.api_key}, json=payload, timeout=45)
+            r = self._http.post(url, params={"key": self.api_key}, json=payload, timeout=45)
         except Exception as e:
             logger.error(f"Gemini connection error: {e}")
             return ""
@@ -33,7 +33,8 @@ def analyze_pdf(file_path: str):
             
             # Extraer texto de todas las páginas
             print(f"\n📖 Extrayendo texto de todas las páginas...")
-            all_text = ""
+            # Partes por página; se unen una sola vez al final (sin copias crecientes)
+            text_parts = []
             pages_with_text = 0
             pages_text_length = []
             
@@ -44,7 +45,7 @@ def analyze_pdf(file_path: str):
                         pages_with_text += 1
                         text_len = len(page_text)
                         pages_text_length.append(text_len)
-                        all_text += f"\n--- Página {page_num} ---\n{page_text}"
+                        text_parts.append(f"\n--- Página {page_num} ---\n{page_text}")
                         
                         if page_num % 20 == 0:
                             print(f"   Procesadas {page_num}/{total_pages} páginas...")
@@ -52,6 +53,9 @@ def analyze_pdf(file_path: str):
                     print(f"   ⚠️ Error en página {page_num}: {e}")
                     continue
             
+            all_text = "".join(text_parts)
+            del text_parts
+
             print(f"\n✅ Extracción completada:")
             print(f"   Páginas con texto: {pages_with_text}/{total_pages}")
             print(f"   Total de caracteres: {len(all_text):,}")
@@ -0,0 +1,45 @@
+"""
+Script para exportar el modelo de embeddings a ONNX y cuantizarlo a INT8
+Se ejecuta UNA sola vez (localmente o en Colab):
+    python scripts/exportar_embeddings_onnx.py [directorio_salida]
+
+Luego definir EMBEDDINGS_ONNX_DIR=<directorio_salida> para que el RAG lo use.
+Requiere: pip install "optimum[onnxruntime]"
+"""
+
+import sys
+from pathlib import Path
+
+MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+DEFAULT_OUT = "models/onnx-minilm-int8"
+
+
+def export_int8(out_dir: str):
+    """
+    Exportar MiniLM a ONNX y generar model_quantized.onnx (INT8 dinámico)
+    """
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    from transformers import AutoTokenizer
+
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+
+    print(f"📦 Exportando {MODEL_NAME} a ONNX...")
+    model = ORTModelForFeatureExtraction.from_pretrained(MODEL_NAME, export=True)
+    model.save_pretrained(out)
+    AutoTokenizer.from_pretrained(MODEL_NAME).save_pretrained(out)
+
+    print("⚙️ Cuantizando pesos a INT8...")
+    quantize_dynamic(
+        str(out / "model.onnx"),
+        str(out / "model_quantized.onnx"),
+        weight_type=QuantType.QInt8,
+    )
+
+    print(f"✅ Modelo INT8 listo en: {out}")
+    print(f"   Usar con: EMBEDDINGS_ONNX_DIR={out}")
+
+
+if __name__ == "__main__":
+    export_int8(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_OUT)
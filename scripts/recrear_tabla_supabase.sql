@@ -25,10 +25,12 @@ CREATE TABLE vecs.arbot_documents (
 );
 
 -- Crear índice para búsquedas vectoriales eficientes
-CREATE INDEX IF NOT EXISTS arbot_documents_vec_idx 
+-- La búsqueda usa <=> (distancia coseno), así que el op-class debe ser
+-- vector_cosine_ops (correcto tanto con embeddings normalizados como sin normalizar)
+CREATE INDEX IF NOT EXISTS arbot_documents_vec_hnsw_cos 
 ON vecs.arbot_documents 
-USING ivfflat (vec vector_cosine_ops)
-WITH (lists = 100);
+USING hnsw (vec vector_cosine_ops)
+WITH (m = 16, ef_construction = 64);
 
 -- Crear índice GIN para búsquedas en metadata JSONB
 CREATE INDEX IF NOT EXISTS arbot_documents_metadata_idx 
@@ -9,6 +9,35 @@ import re
 
 logger = logging.getLogger("services.generator")
 
+# Frases de identidad del modelo que se eliminan del resumen
+BLOCKED_PATTERNS = [
+    "soy un modelo de lenguaje",
+    "como ia",
+    "como inteligencia artificial",
+    "fui entrenado",
+    "no tengo acceso",
+    "no tengo la capacidad",
+    "mi conocimiento se basa",
+]
+
+# Compilados una sola vez: búsqueda y borrado en una pasada, sin copia en minúsculas
+_BLOCKED_RE = re.compile("|".join(re.escape(p) for p in BLOCKED_PATTERNS), re.IGNORECASE)
+_WS_RE = re.compile(r"\s+")
+
+# Plantilla del prompt (Modo D): solo se sustituyen contexto y pregunta
+_PROMPT_TMPL = (
+    "A continuación tienes un fragmento oficial del Manual de Convivencia Escolar Roldanista:\n\n"
+    "«%s»\n\n"
+    "INSTRUCCIONES IMPORTANTES:\n"
+    "- Usa únicamente la información presente en el texto anterior.\n"
+    "- No inventes información nueva.\n"
+    "- No agregues interpretaciones externas.\n"
+    "- No menciones que eres un modelo de lenguaje.\n\n"
+    "Pregunta del usuario: %s\n\n"
+    "Genera un resumen claro y fiel al contenido:\n\n"
+    "Resumen:"
+)
+
 
 class ContentGenerator:
     def __init__(self, api_model, text_processor):
@@ -23,26 +52,13 @@ class ContentGenerator:
         if not text:
             return None
 
-        low = text.lower()
-
-        BLOCKED_PATTERNS = [
-            "soy un modelo de lenguaje",
-            "como ia",
-            "como inteligencia artificial",
-            "fui entrenado",
-            "no tengo acceso",
-            "no tengo la capacidad",
-            "mi conocimiento se basa",
-        ]
-
         # En la versión nueva, NO eliminamos todo → solo limpiamos la frase
-        for pattern in BLOCKED_PATTERNS:
-            if pattern in low:
-                logger.warning("🟥 Eliminando frase de identidad IA detectada en la respuesta…")
-                text = re.sub(re.escape(pattern), "", text, flags=re.IGNORECASE)
+        text, n = _BLOCKED_RE.subn("", text)
+        if n:
+            logger.warning("🟥 Eliminando frase de identidad IA detectada en la respuesta…")
 
         # quitar dobles espacios si quedaron
-        text = re.sub(r"\s+", " ", text).strip()
+        text = _WS_RE.sub(" ", text).strip()
 
         return text if text else None
 
@@ -113,18 +129,7 @@ class ContentGenerator:
         # -------------------------------------------------------
         # 1. Prompt para generar SOLO un resumen claro y seguro
         # -------------------------------------------------------
-        prompt = (
-            "A continuación tienes un fragmento oficial del Manual de Convivencia Escolar Roldanista:\n\n"
-            f"«{context}»\n\n"
-            "INSTRUCCIONES IMPORTANTES:\n"
-            "- Usa únicamente la información presente en el texto anterior.\n"
-            "- No inventes información nueva.\n"
-            "- No agregues interpretaciones externas.\n"
-            "- No menciones que eres un modelo de lenguaje.\n\n"
-            f"Pregunta del usuario: {user_input}\n\n"
-            "Genera un resumen claro y fiel al contenido:\n\n"
-            "Resumen:"
-        )
+        prompt = _PROMPT_TMPL % (context, user_input)
 
         # -------------------------------------------------------
         # 2. Llamada al modelo (solo para el resumen)
@@ -5,13 +5,23 @@ Incluye caching, singleton real y uso eficiente de RAM.
 """
 
 import os
-import json
+import re
+import time
+import hashlib
+import queue
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import Future
+from typing import List, Dict, Any, Optional, Tuple
 
+import numpy as np
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from sentence_transformers import SentenceTransformer
+from psycopg2.extensions import connection as PGConnection
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
+from pgvector.psycopg2 import register_vector
 
 # ============================================================
 # LOGGING
@@ -19,25 +29,250 @@ from sentence_transformers import SentenceTransformer
 logger = logging.getLogger("services.rag_service")
 logger.setLevel(logging.INFO)
 
+# ============================================================
+# PARÁMETROS DE EMBEDDINGS
+# ============================================================
+# Micro-batching: tamaño máximo del lote y ventana de espera extra (ms).
+# Con 0 solo se agrupa lo que ya está en cola: una consulta sola no espera
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "0"))
+# Longitud máxima en tokens (las consultas son cortas)
+EMBED_MAX_SEQ_LENGTH = int(os.getenv("EMBED_MAX_SEQ_LENGTH", "128"))
+# Tamaño de lote de encode() en embed_batch (varias consultas de una vez)
+EMBED_BATCH = int(os.getenv("EMBED_BATCH", "32"))
+# Cachés LRU en memoria: embeddings (~1.5 KB c/u) y resultados top-k
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE", "2048"))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE", "1024"))
+# Vigencia (s) de resultados y contextos cacheados: tras re-ingestar documentos
+# un worker en marcha deja de servir hits viejos como mucho en este tiempo
+# (0 = sin vencimiento). Los embeddings no dependen de la tabla → sin TTL
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "300"))
+
+
+def _digest(text: str) -> bytes:
+    """Clave de caché: SHA-256 del texto."""
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class LRUCache:
+    """
+    LRU acotado y thread-safe, con contadores de aciertos para get_stats().
+    Con ttl > 0 cada entrada vence a los ttl segundos de guardada.
+    """
+
+    def __init__(self, maxsize: int, ttl: float = 0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl > 0 else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
 
 # ============================================================
 # SINGLETON PARA EL MODELO DE EMBEDDINGS
 # ============================================================
+class OnnxSentenceEncoder:
+    """
+    MiniLM exportado a ONNX y cuantizado a INT8 (ver scripts/exportar_embeddings_onnx.py).
+    Expone el mismo encode() que SentenceTransformer: tokeniza → session.run → mean pooling.
+    """
+
+    def __init__(self, model_dir: str, file_name: str = "model_quantized.onnx", max_seq_length: int = EMBED_MAX_SEQ_LENGTH):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.session = ORTModelForFeatureExtraction.from_pretrained(model_dir, file_name=file_name)
+        self.max_seq_length = max_seq_length
+
+    def encode(self, sentences, batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, normalize_embeddings: bool = False) -> np.ndarray:
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        out = []
+        for i in range(0, len(sentences), batch_size):
+            enc = self.tokenizer(
+                sentences[i:i + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            hidden = self.session(**enc).last_hidden_state
+            # Mean pooling (igual que sentence-transformers para este modelo)
+            mask = enc["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            out.append(pooled.astype(np.float32, copy=False))
+
+        embs = np.concatenate(out)
+        if normalize_embeddings:
+            embs /= np.clip(np.linalg.norm(embs, axis=1, keepdims=True), 1e-12, None)
+        return embs[0] if single else embs
+
+
 class EmbeddingsSingleton:
     _model = None
+    _inference_mode = nullcontext
 
     @staticmethod
     def get_model():
         """Carga el modelo UNA sola vez en toda la app."""
         if EmbeddingsSingleton._model is None:
+            onnx_dir = os.getenv("EMBEDDINGS_ONNX_DIR")
+            if onnx_dir:
+                # Backend INT8 (ONNX Runtime) para CPU
+                logger.info(f"🧠 Cargando embeddings ONNX INT8 desde: {onnx_dir}")
+                EmbeddingsSingleton._model = OnnxSentenceEncoder(onnx_dir)
+                return EmbeddingsSingleton._model
+
+            # Import diferido: torch/transformers solo se cargan al primer embedding
+            from sentence_transformers import SentenceTransformer
+
             model_name = os.getenv(
                 "EMBEDDINGS_MODEL",
                 "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
             )
             logger.info(f"🧠 Cargando modelo de embeddings: {model_name}")
-            EmbeddingsSingleton._model = SentenceTransformer(model_name)
+            model = SentenceTransformer(model_name)
+
+            import torch
+            torch.backends.mkldnn.enabled = True
+            # Por defecto se respeta lo que torch ya tomó de OMP_NUM_THREADS (el
+            # Dockerfile lo fija a 1; os.cpu_count() en un contenedor ve las CPUs
+            # del host, no la cuota). Solo se cambia si TORCH_NUM_THREADS está definido
+            torch_threads = os.getenv("TORCH_NUM_THREADS")
+            if torch_threads:
+                torch.set_num_threads(int(torch_threads))
+            logger.info(f"🧵 torch usando {torch.get_num_threads()} hilo(s) de cómputo.")
+            try:
+                torch.set_num_interop_threads(2)
+            except RuntimeError:
+                # Solo se puede fijar antes de que torch arranque trabajo en paralelo
+                pass
+
+            model.eval()
+            # Las consultas son cortas: no pagar padding hasta el máximo por defecto
+            model.max_seq_length = EMBED_MAX_SEQ_LENGTH
+            EmbeddingsSingleton._inference_mode = torch.inference_mode
+            EmbeddingsSingleton._model = model
         return EmbeddingsSingleton._model
 
+    @staticmethod
+    def inference_mode():
+        """Contexto sin autograd para encode() (no-op en el backend ONNX)."""
+        return EmbeddingsSingleton._inference_mode()
+
+
+# ============================================================
+# MICRO-BATCHING DE CONSULTAS
+# ============================================================
+class QueryEmbedder:
+    """
+    Agrupa las consultas que ya esperan en cola (más las que lleguen dentro
+    de max_wait, si es > 0) y las codifica con un único model.encode(batch)
+    en un hilo de fondo.
+    """
+
+    def __init__(self, max_batch: int = 32, max_wait: float = 0.0):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="query-embedder", daemon=True)
+        self._worker.start()
+
+    def submit(self, text: str) -> Future:
+        """Encola un texto; el Future se resuelve con su embedding."""
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> np.ndarray:
+        return self.submit(text).result(timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Lo que llegó mientras se codificaba el lote anterior, sin esperar
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if self.max_wait > 0:
+                deadline = time.monotonic() + self.max_wait
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+            self._encode_batch(batch)
+
+    def _encode_batch(self, batch: List[Tuple[str, Future]]):
+        try:
+            model = EmbeddingsSingleton.get_model()
+            with EmbeddingsSingleton.inference_mode():
+                embs = model.encode(
+                    [text for text, _ in batch],
+                    batch_size=self.max_batch,
+                    show_progress_bar=False,
+                    convert_to_numpy=True,
+                    normalize_embeddings=True,
+                )
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), emb in zip(batch, embs):
+            future.set_result(emb)
+
 
 # Dimensión del modelo MiniLM-L12-v2 = 384
 VECTOR_DIM = int(os.getenv("VECTOR_DIM", "384"))
@@ -45,6 +280,53 @@ VECTOR_DIM = int(os.getenv("VECTOR_DIM", "384"))
 DEFAULT_SCHEMA = "vecs"
 DEFAULT_TABLE = "arbot_documents"
 
+# Pool de conexiones a Postgres (una conexión por hilo en uso)
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", "1"))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", "10"))
+# Sentencia KNN preparada por conexión (desactivar con el pooler en modo transacción)
+PG_PREPARE = os.getenv("PG_PREPARE", "true").lower() == "true"
+
+# Índice HNSW por distancia coseno (<=>, op-class vector_cosine_ops). Con las
+# consultas normalizadas ordena igual que el producto interno, y sigue siendo
+# correcto con filas ingestadas sin normalizar (no depende de la norma de vec).
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 64
+# Punto de operación de la búsqueda (por sesión): más ef_search/probes = más recall
+# y más latencia. RAG_PROBES solo aplica si la tabla usa un índice IVFFlat.
+RAG_EF_SEARCH = int(os.getenv("RAG_EF_SEARCH", "40"))
+RAG_PROBES = int(os.getenv("RAG_PROBES", "0"))
+
+
+def _ef_search_prefix(top_k: int) -> str:
+    """
+    HNSW devuelve como mucho ef_search filas: si top_k lo supera, se sube solo
+    para esa consulta. SET LOCAL va en el mismo mensaje que la KNN (transacción
+    implícita), así que no cuesta otro round-trip ni altera la sesión.
+    """
+    if top_k <= RAG_EF_SEARCH:
+        return ""
+    return f"SET LOCAL hnsw.ef_search = {int(top_k)}; "
+
+# Detección de "artículo N" en la consulta (búsqueda híbrida).
+# Solo se inspeccionan los primeros caracteres para acotar el trabajo del regex.
+_ARTICLE_RE = re.compile(r"art[íi]culo\s*(\d+)", re.IGNORECASE)
+ARTICLE_SCAN_CHARS = 500
+
+# Candidatos mínimos para armar contexto: el armado corta en cuanto se llena
+CONTEXT_MIN_CANDIDATES = 8
+
+
+class PooledConnection(PGConnection):
+    """
+    Conexión del pool.
+    `ready`: ya se configuró (pgvector, GUCs) · `prepared`: sentencias KNN ya preparadas.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ready = False
+        self.prepared = set()
+
 
 # ============================================================
 # RAG SERVICE
@@ -65,82 +347,311 @@ class RAGService:
         self.schema = os.getenv("SCHEMA", DEFAULT_SCHEMA)
         self.table = os.getenv("TABLE", DEFAULT_TABLE)
         self.vector_dim = VECTOR_DIM
+        self._embed_cache = LRUCache(EMBED_CACHE_SIZE)
+        self._search_cache = LRUCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+        # Expresión SQL de metadata: se castea a jsonb en el servidor si la columna es text
+        self._metadata_sql = "metadata"
 
         # --------------------------
         # CONEXIÓN BD
         # --------------------------
-        self.conn = self._connect_db()
-        self._ensure_table()
-        self._log_stats()
+        self.pool = self._connect_db()
+        try:
+            total = self._ensure_table()
+            self._ensure_vector_index()
+        except Exception:
+            # Instancia descartada: no dejar conexiones abiertas en cada reintento
+            self.pool.closeall()
+            raise
+
+        # El hilo del micro-batching se arranca recién con la BD validada: un
+        # init fallido (get_rag() reintenta en cada request) no deja hilos vivos
+        self.embedder = QueryEmbedder(EMBED_MAX_BATCH, EMBED_BATCH_WAIT_MS / 1000.0)
+
+        # SQL de la búsqueda KNN (schema/tabla/tipo de metadata fijos → se arma una sola vez)
+        #   arbot_knn:      text + metadata completos
+        #   arbot_knn_text: solo LEFT(text, n), para armar contexto
+        #   arbot_knn_ctx:  LEFT(text, n) + metadata solo del primer hit con texto
+        #                   (get_context_with_metadata)
+        self._knn_sql = {
+            "arbot_knn": f"""
+                SELECT text, {self._metadata_sql} AS metadata, (vec <=> %(emb)s) AS distance
+                FROM {self.schema}.{self.table}
+                ORDER BY distance ASC
+                LIMIT %(k)s;
+            """,
+            "arbot_knn_text": f"""
+                SELECT LEFT(text, %(chars)s) AS text, (vec <=> %(emb)s) AS distance
+                FROM {self.schema}.{self.table}
+                ORDER BY distance ASC
+                LIMIT %(k)s;
+            """,
+            "arbot_knn_ctx": self._knn_ctx_sql("%(emb)s", "%(k)s", "%(chars)s"),
+        }
+        self._knn_prepare_sql = {
+            "arbot_knn": f"""
+                PREPARE arbot_knn(vector, int) AS
+                SELECT text, {self._metadata_sql} AS metadata, (vec <=> $1) AS distance
+                FROM {self.schema}.{self.table}
+                ORDER BY vec <=> $1
+                LIMIT $2
+            """,
+            "arbot_knn_text": f"""
+                PREPARE arbot_knn_text(vector, int, int) AS
+                SELECT LEFT(text, $3) AS text, (vec <=> $1) AS distance
+                FROM {self.schema}.{self.table}
+                ORDER BY vec <=> $1
+                LIMIT $2
+            """,
+            "arbot_knn_ctx": "PREPARE arbot_knn_ctx(vector, int, int) AS" + self._knn_ctx_sql("$1", "$2", "$3"),
+        }
+
+        logger.info(f"📚 Documentos cargados: ~{total}")
+        logger.info(
+            f"🎯 Búsqueda vectorial: hnsw.ef_search={RAG_EF_SEARCH}"
+            + (f", ivfflat.probes={RAG_PROBES}" if RAG_PROBES > 0 else "")
+            + " (subir = más recall, bajar = menos latencia; con top_k mayor se sube por consulta)"
+        )
 
         # Modelo NO se carga aquí → lazy load con Singleton
         logger.info("🟩 RAGService listo.")
 
+    def _knn_ctx_sql(self, emb: str, k: str, chars: str) -> str:
+        """
+        KNN para contexto + referencia: texto recortado en el servidor y la
+        metadata solo del primer hit con texto (el resto viaja como NULL).
+        text <> '' compara longitudes sin des-toastear el texto completo.
+        """
+        return f"""
+            SELECT LEFT(d.text, {chars}) AS text,
+                   CASE WHEN d.text <> '' AND count(*) FILTER (WHERE d.text <> '')
+                             OVER (ORDER BY d.distance ROWS UNBOUNDED PRECEDING) = 1
+                        THEN d.metadata END AS metadata,
+                   d.distance
+            FROM (
+                SELECT text, {self._metadata_sql} AS metadata, (vec <=> {emb}) AS distance
+                FROM {self.schema}.{self.table}
+                ORDER BY vec <=> {emb}
+                LIMIT {k}
+            ) AS d
+            ORDER BY d.distance
+        """
+
     # ==========================================================
     # BASE DE DATOS
     # ==========================================================
-    def _connect_db(self):
+    def _connect_db(self) -> ThreadedConnectionPool:
         try:
-            conn = psycopg2.connect(self.db_url)
-            conn.autocommit = True
-            logger.info("🔗 Conectado a Supabase Postgres.")
-            return conn
+            pool = ThreadedConnectionPool(
+                PG_POOL_MIN,
+                PG_POOL_MAX,
+                dsn=self.db_url,
+                connection_factory=PooledConnection,
+            )
+            logger.info(f"🔗 Conectado a Supabase Postgres (pool {PG_POOL_MIN}-{PG_POOL_MAX}).")
+            return pool
         except Exception as e:
             logger.error("❌ Error conectando a Supabase.")
             raise e
 
-    def _ensure_table(self):
-        """Valida que la tabla tenga columnas text + vec."""
+    def _setup_connection(self, conn: PooledConnection):
+        """Configuración por conexión física, una sola vez."""
+        conn.autocommit = True
+        # Embeddings numpy → parámetro `vector` nativo (sin literal de texto)
+        register_vector(conn)
+
+        # Con autocommit un SET LOCAL no tendría efecto → se fija para la sesión
         try:
-            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT column_name FROM information_schema.columns
-                    WHERE table_schema = %s AND table_name = %s;
-                """, (self.schema, self.table))
+            with conn.cursor() as cur:
+                cur.execute("SET hnsw.ef_search = %s", (RAG_EF_SEARCH,))
+                if RAG_PROBES > 0:
+                    cur.execute("SET ivfflat.probes = %s", (RAG_PROBES,))
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo fijar hnsw.ef_search / ivfflat.probes: {e}")
 
-                cols = {row["column_name"] for row in cur.fetchall()}
+        conn.ready = True
 
+    @contextmanager
+    def _cursor(self, cursor_factory=None):
+        """Toma una conexión del pool, entrega un cursor y la devuelve al terminar."""
+        conn = self.pool.getconn()
+        broken = False
+        try:
+            if not conn.ready:
+                self._setup_connection(conn)
+            with conn.cursor(cursor_factory=cursor_factory) as cur:
+                yield cur
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # Conexión caída: se descarta para que el pool abra otra
+            broken = True
+            raise
+        finally:
+            self.pool.putconn(conn, close=broken or bool(conn.closed))
+
+    def _execute_knn(self, cur, emb: np.ndarray, top_k: int, max_chars: Optional[int] = None,
+                     with_metadata: bool = False):
+        """
+        Ejecuta la KNN; con PG_PREPARE usa la sentencia preparada de la conexión.
+        Con max_chars solo trae LEFT(text, max_chars) y distance (sin metadata), o
+        con with_metadata (text, metadata del primer hit con texto, distance).
+        distance = vec <=> emb (distancia coseno): similitud = 1 - distance.
+        """
+        if max_chars is None:
+            name, params = "arbot_knn", {"emb": emb, "k": top_k}
+        else:
+            name = "arbot_knn_ctx" if with_metadata else "arbot_knn_text"
+            params = {"emb": emb, "k": top_k, "chars": max_chars}
+        prefix = _ef_search_prefix(top_k)
+        execute_sql = prefix + f"EXECUTE {name}(%(emb)s, %(k)s" + (", %(chars)s)" if "chars" in params else ")")
+
+        if not PG_PREPARE:
+            cur.execute(prefix + self._knn_sql[name], params)
+            return
+
+        conn = cur.connection
+        if name not in conn.prepared:
+            cur.execute(self._knn_prepare_sql[name])
+            conn.prepared.add(name)
+        cur.execute(execute_sql, params)
+
+    def _knn_rows(self, cur, emb: np.ndarray, top_k: int, max_chars: Optional[int] = None,
+                  with_metadata: bool = False):
+        """
+        Filas de la KNN para un embedding ya calculado, leídas del cursor a
+        demanda. El cursor lo aporta el llamador (dentro de `with self._cursor()`),
+        así el generador nunca retiene una conexión del pool.
+        """
+        self._execute_knn(cur, emb, top_k, max_chars, with_metadata)
+        yield from cur
+
+    def _ensure_table(self) -> int:
+        """
+        Valida que la tabla tenga columnas text + vec y devuelve el total
+        (aproximado) de documentos, todo en un solo round-trip.
+        """
+        try:
+            with self._cursor(RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT
+                        (SELECT json_object_agg(column_name, data_type) FROM information_schema.columns
+                         WHERE table_schema = %s AND table_name = %s) AS cols,
+                        (SELECT reltuples::bigint FROM pg_class
+                         WHERE oid = to_regclass(%s)) AS n;
+                """, (self.schema, self.table, f"{self.schema}.{self.table}"))
+                row = cur.fetchone()
+
+                cols = row["cols"] or {}
                 if "text" not in cols or "vec" not in cols:
                     raise RuntimeError(
                         f"Tabla {self.schema}.{self.table} inválida. "
                         "Debe tener columnas: text (text), vec (vector)"
                     )
+
+                if cols.get("metadata") in ("text", "character varying"):
+                    logger.warning(
+                        f"⚠️ {self.schema}.{self.table}.metadata es {cols['metadata']}; "
+                        "se castea a jsonb en cada consulta (conviene migrar la columna a JSONB)."
+                    )
+                    self._metadata_sql = "metadata::jsonb"
+
+                return self._count_documents(cur, row["n"])
         except Exception:
             logger.exception("❌ Error verificando tabla de RAG.")
             raise
 
-    def _log_stats(self):
+    def _count_documents(self, cur, approx: Optional[int]) -> int:
+        """
+        Total de documentos usando la estimación de pg_class.reltuples.
+        Solo hace COUNT(*) si la tabla aún no tiene estadísticas (-1) o marca 0
+        (p. ej. recién ingestada, antes del autoanalyze).
+        """
+        if approx is not None and approx > 0:
+            return int(approx)
+        cur.execute(f"SELECT COUNT(*) AS n FROM {self.schema}.{self.table}")
+        row = cur.fetchone()
+        return int(row["n"] if isinstance(row, dict) else row[0])
+
+    def _ensure_vector_index(self):
+        """
+        Crea (si falta) el índice HNSW sobre vec para evitar el Seq Scan en la búsqueda.
+        Si ya hay un índice coseno sobre vec (p. ej. el IVFFlat arbot_documents_vec_idx
+        de instalaciones anteriores) no se construye otro: duplicaría memoria y escrituras.
+        """
+        index_name = f"{self.table}_vec_hnsw_cos"
         try:
-            with self.conn.cursor() as cur:
-                cur.execute(f"SELECT COUNT(*) FROM {self.schema}.{self.table}")
-                total = cur.fetchone()[0]
-                logger.info(f"📚 Documentos cargados: {total}")
-        except Exception:
-            logger.warning("⚠️ No se pudo obtener stats del RAG.")
+            with self._cursor() as cur:
+                cur.execute("""
+                    SELECT ic.relname, am.amname
+                    FROM pg_index i
+                    JOIN pg_class ic ON ic.oid = i.indexrelid
+                    JOIN pg_am am ON am.oid = ic.relam
+                    JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+                    JOIN pg_opclass oc ON oc.oid = i.indclass[0]
+                    WHERE i.indrelid = to_regclass(%s)
+                      AND a.attname = 'vec'
+                      AND oc.opcname = 'vector_cosine_ops'
+                    LIMIT 1;
+                """, (f"{self.schema}.{self.table}",))
+                existing = cur.fetchone()
+                if existing and existing[0] == index_name:
+                    logger.info(f"🧭 Índice HNSW listo: {self.schema}.{index_name}")
+                    return
+                if existing:
+                    logger.info(
+                        f"🧭 Índice vectorial coseno existente: {self.schema}.{existing[0]} "
+                        f"({existing[1]}); no se crea {index_name}"
+                    )
+                    return
+
+                cur.execute(f"""
+                    CREATE INDEX IF NOT EXISTS {index_name}
+                    ON {self.schema}.{self.table}
+                    USING hnsw (vec vector_cosine_ops)
+                    WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION});
+                """)
+            logger.info(f"🧭 Índice HNSW listo: {self.schema}.{index_name}")
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo crear el índice HNSW: {e}")
 
     # ==========================================================
     # EMBEDDINGS
     # ==========================================================
-    def embed(self, text: str) -> List[float]:
-        """Convierte texto → vector usando Singleton (muy bajo RAM)."""
+    def embed(self, text: str) -> Optional[np.ndarray]:
+        """Convierte texto → vector float32 usando Singleton (muy bajo RAM)."""
         if not text:
-            return []
+            return None
+
+        key = _digest(text)
+        cached = self._embed_cache.get(key)
+        if cached is not None:
+            return cached
 
         try:
-            model = EmbeddingsSingleton.get_model()
-            emb = model.encode(
-                text,
-                show_progress_bar=False,
-                convert_to_numpy=True
-            )
-            return emb.tolist()
+            emb = self.embedder.embed(text).astype(np.float32, copy=False)
         except Exception as e:
             logger.error(f"❌ Error generando embedding: {e}")
-            return []
-
-    def _vec_literal(self, emb: List[float]) -> str:
-        """Convierte embedding en literal PostgreSQL pgvector."""
-        return "[" + ",".join(f"{x:.6f}" for x in emb) + "]"
+            return None
+
+        # Compartido entre llamadas → solo lectura
+        emb.setflags(write=False)
+        self._embed_cache.put(key, emb)
+        return emb
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Varios textos → matriz float32 (n, dim) normalizada, en un solo encode()."""
+        if not texts:
+            return np.empty((0, self.vector_dim), dtype=np.float32)
+
+        model = EmbeddingsSingleton.get_model()
+        with EmbeddingsSingleton.inference_mode():
+            embs = model.encode(
+                texts,
+                batch_size=EMBED_BATCH,
+                show_progress_bar=False,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+            )
+        return embs.astype(np.float32, copy=False)
 
     # ==========================================================
     # BÚSQUEDA POR METADATA (artículos específicos)
@@ -148,10 +659,10 @@ class RAGService:
     def search_by_article(self, article_num: str, top_k: int = 3) -> List[Dict[str, Any]]:
         """Busca chunks por número de artículo en metadata o texto."""
         sql = f"""
-            SELECT text, metadata, 0.0 AS distance
+            SELECT text, {self._metadata_sql} AS metadata, 0.0 AS distance
             FROM {self.schema}.{self.table}
             WHERE 
-                metadata->>'article' ILIKE %s
+                {self._metadata_sql}->>'article' ILIKE %s
                 OR text ILIKE %s
             LIMIT %s;
         """
@@ -159,22 +670,17 @@ class RAGService:
         pattern_text = f'%artículo {article_num}%'
         
         try:
-            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+            with self._cursor() as cur:
                 cur.execute(sql, (pattern_meta, pattern_text, top_k))
                 rows = cur.fetchall()
             
             results = []
-            for row in rows:
-                meta = row["metadata"]
-                if isinstance(meta, str):
-                    try:
-                        meta = json.loads(meta)
-                    except:
-                        pass
+            for text, meta, _ in rows:
                 results.append({
-                    "text": row["text"],
+                    "text": text,
                     "metadata": meta,
                     "distance": 0.0,
+                    "similarity": 1.0,
                 })
             
             if results:
@@ -188,52 +694,108 @@ class RAGService:
     # ==========================================================
     # BÚSQUEDA VECTORIAL
     # ==========================================================
-    def search_similar_chunks(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    def search_similar_chunks(self, query: str, top_k: int = 5, fetch_text_only: bool = False,
+                              max_chars: int = 6000) -> List[Dict[str, Any]]:
+        """
+        Top-k chunks para la consulta (con caché LRU por consulta + parámetros).
+        fetch_text_only: la búsqueda vectorial devuelve solo text (recortado en el
+        servidor a max_chars) y distance, sin metadata.
+        """
         if not query:
             return []
 
-        # BÚSQUEDA HÍBRIDA: Primero por metadata si menciona artículo
-        import re
-        article_match = re.search(r'art[íi]culo\s*(\d+)', query.lower())
-        if article_match:
-            article_num = article_match.group(1)
-            metadata_results = self.search_by_article(article_num, top_k)
-            if metadata_results:
-                return metadata_results
-            logger.info(f"⚠️ Artículo {article_num} no encontrado por metadata, buscando vectorialmente...")
+        if not fetch_text_only:
+            max_chars = None
 
-        emb = self.embed(query)
-        if not emb:
-            return []
+        key = (_digest(query), top_k, max_chars)
+        cached = self._search_cache.get(key)
+        if cached is not None:
+            return cached
 
-        vec = self._vec_literal(emb)
+        results = self._search_similar_chunks(query, top_k, max_chars)
+        if results:
+            self._search_cache.put(key, results)
+        return results
 
-        sql = f"""
-            SELECT text, metadata, (vec <-> %s::vector) AS distance
-            FROM {self.schema}.{self.table}
-            ORDER BY distance ASC
-            LIMIT %s;
+    def search_similar_chunks_batch(self, queries: List[str], top_k: int = 5) -> List[List[Dict[str, Any]]]:
+        """
+        Top-k vectorial para varias consultas en un solo round-trip
+        (VALUES + JOIN LATERAL, un plan para todas). Sin búsqueda por artículo
+        ni caché: pensado para re-ranking / expansión de consultas.
+        """
+        if not queries:
+            return []
+
+        embs = self.embed_batch(queries)
+        sql = _ef_search_prefix(top_k) + f"""
+            SELECT q.i, d.text, d.metadata, d.distance
+            FROM (VALUES %s) AS q(i, v)
+            CROSS JOIN LATERAL (
+                SELECT text, {self._metadata_sql} AS metadata, (vec <=> q.v) AS distance
+                FROM {self.schema}.{self.table}
+                ORDER BY vec <=> q.v
+                LIMIT {int(top_k)}
+            ) AS d
+            ORDER BY q.i, d.distance;
         """
 
+        results: List[List[Dict[str, Any]]] = [[] for _ in queries]
         try:
-            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute(sql, (vec, top_k))
-                rows = cur.fetchall()
+            with self._cursor() as cur:
+                rows = execute_values(
+                    cur, sql, list(enumerate(embs)),
+                    template="(%s, %s::vector)", page_size=len(queries), fetch=True,
+                )
+        except Exception:
+            logger.exception("❌ Error en búsqueda pgvector por lotes.")
+            return results
 
-            results = []
-            for row in rows:
-                meta = row["metadata"]
-                if isinstance(meta, str):
-                    try:
-                        meta = json.loads(meta)
-                    except:
-                        pass
+        for i, text, meta, distance in rows:
+            results[i].append({
+                "text": text,
+                "metadata": meta,
+                "distance": distance,
+                "similarity": 1.0 - distance,
+            })
+        return results
+
+    def _search_article_in_query(self, query: str, top_k: int) -> List[Dict[str, Any]]:
+        """BÚSQUEDA HÍBRIDA: si la consulta menciona un artículo, buscarlo por metadata."""
+        article_match = _ARTICLE_RE.search(query, 0, ARTICLE_SCAN_CHARS)
+        if not article_match:
+            return []
 
-                results.append({
-                    "text": row["text"],
-                    "metadata": meta,
-                    "distance": float(row["distance"]),
-                })
+        article_num = article_match.group(1)
+        metadata_results = self.search_by_article(article_num, top_k)
+        if not metadata_results:
+            logger.info(f"⚠️ Artículo {article_num} no encontrado por metadata, buscando vectorialmente...")
+        return metadata_results
+
+    def _search_similar_chunks(self, query: str, top_k: int, max_chars: Optional[int]) -> List[Dict[str, Any]]:
+        metadata_results = self._search_article_in_query(query, top_k)
+        if metadata_results:
+            return metadata_results
+
+        emb = self.embed(query)
+        if emb is None:
+            return []
+
+        try:
+            # Cursor de tuplas: columnas en orden fijo (text, metadata, distance)
+            with self._cursor() as cur:
+                rows = self._knn_rows(cur, emb, top_k, max_chars)
+                if max_chars is not None:
+                    return [{"text": text, "distance": distance, "similarity": 1.0 - distance}
+                            for text, distance in rows]
+
+                results = []
+                for text, meta, distance in rows:
+                    results.append({
+                        "text": text,
+                        "metadata": meta,
+                        "distance": distance,
+                        "similarity": 1.0 - distance,
+                    })
 
             return results
 
@@ -244,60 +806,100 @@ class RAGService:
     # ==========================================================
     # CONTEXTO
     # ==========================================================
-    def get_context_for_query(self, query: str, top_k: int = 5, max_context_length: int = 6000) -> str:
-        """Devuelve contexto concatenado para el modelo."""
-        hits = self.search_similar_chunks(query, top_k)
-        if not hits:
-            return ""
-
+    @staticmethod
+    def _assemble_context(texts, max_context_length: int) -> str:
+        """Concatena textos hasta llenar max_context_length; deja de consumir al llenarse."""
         parts = []
         total = 0
 
-        for hit in hits:
-            chunk = hit["text"]
+        for chunk in texts:
             if not chunk:
                 continue
 
             if total + len(chunk) > max_context_length:
-                parts.append(chunk[:max_context_length-total])
+                if total < max_context_length:
+                    parts.append(chunk[:max_context_length-total])
                 break
 
             parts.append(chunk)
             total += len(chunk)
 
-        context = "\n\n".join(parts)
+        return "\n\n".join(parts)
+
+    def get_context_for_query(self, query: str, top_k: int = 5, max_context_length: int = 6000) -> str:
+        """Devuelve contexto concatenado para el modelo."""
+        if not query:
+            return ""
+
+        key = ("context", _digest(query), top_k, max_context_length)
+        cached = self._search_cache.get(key)
+        if cached is not None:
+            return cached
+
+        article_hits = self._search_article_in_query(query, top_k)
+        if article_hits:
+            context = self._assemble_context((hit["text"] for hit in article_hits), max_context_length)
+        else:
+            emb = self.embed(query)
+            if emb is None:
+                return ""
+
+            # Recuperación + armado en una sola pasada sobre el cursor:
+            # solo texto recortado en el servidor, sin lista intermedia de hits.
+            # Se piden al menos CONTEXT_MIN_CANDIDATES filas y se corta al llenarse.
+            try:
+                with self._cursor() as cur:
+                    rows = self._knn_rows(cur, emb, max(top_k, CONTEXT_MIN_CANDIDATES), max_context_length)
+                    context = self._assemble_context((row[0] for row in rows), max_context_length)
+            except Exception:
+                logger.exception("❌ Error en búsqueda pgvector.")
+                return ""
+
+        if context:
+            self._search_cache.put(key, context)
         logger.info(f"📎 Contexto generado: {len(context)} chars.")
         return context
 
     def get_context_with_metadata(self, query: str, top_k: int = 5, max_context_length: int = 6000) -> Dict[str, Any]:
         """Devuelve contexto + metadatos para mostrar referencias."""
-        hits = self.search_similar_chunks(query, top_k)
-        if not hits:
+        if not query:
             return {"context": "", "metadata": None}
 
-        parts = []
-        total = 0
-        best_metadata = None
+        key = ("context_meta", _digest(query), top_k, max_context_length)
+        cached = self._search_cache.get(key)
+        if cached is not None:
+            return cached
 
-        for hit in hits:
-            chunk = hit["text"]
-            if not chunk:
-                continue
-
-            # Guardar metadatos del primer hit (más relevante)
-            if best_metadata is None:
-                best_metadata = hit.get("metadata", {})
+        hits = self._search_article_in_query(query, top_k)
+        if not hits:
+            emb = self.embed(query)
+            if emb is None:
+                return {"context": "", "metadata": None}
+
+            # Texto recortado en el servidor y metadata solo del primer hit con
+            # texto (las demás filas la traen en NULL): (text, metadata, distance).
+            # Al menos 1 carácter para no vaciar hits con texto
+            chars = max(max_context_length, 1)
+            try:
+                with self._cursor() as cur:
+                    hits = [{"text": text, "metadata": meta}
+                            for text, meta, _ in self._knn_rows(cur, emb, top_k, chars, True)]
+            except Exception:
+                logger.exception("❌ Error en búsqueda pgvector.")
+                return {"context": "", "metadata": None}
 
-            if total + len(chunk) > max_context_length:
-                parts.append(chunk[:max_context_length-total])
-                break
+        if not hits:
+            return {"context": "", "metadata": None}
 
-            parts.append(chunk)
-            total += len(chunk)
+        # Metadatos del primer hit con texto (más relevante)
+        best_metadata = next((hit.get("metadata", {}) for hit in hits if hit["text"]), None)
+        context = self._assemble_context((hit["text"] for hit in hits), max_context_length)
 
-        context = "\n\n".join(parts)
+        result = {"context": context, "metadata": best_metadata}
+        if context:
+            self._search_cache.put(key, result)
         logger.info(f"📎 Contexto generado: {len(context)} chars con metadatos.")
-        return {"context": context, "metadata": best_metadata}
+        return result
 
     # ==========================================================
     # ESTADÍSTICAS
@@ -309,20 +911,58 @@ class RAGService:
             "schema": self.schema,
             "table": self.table,
             "total_documents": 0,
+            "embed_cache": self._embed_cache.stats(),
+            "search_cache": self._search_cache.stats(),
         }
 
         try:
-            with self.conn.cursor() as cur:
-                cur.execute(f"SELECT COUNT(*) FROM {self.schema}.{self.table}")
-                stats["total_documents"] = cur.fetchone()[0]
+            with self._cursor() as cur:
+                cur.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)",
+                            (f"{self.schema}.{self.table}",))
+                row = cur.fetchone()
+                stats["total_documents"] = self._count_documents(cur, row[0] if row else None)
         except:
             pass
 
         return stats
 
+    # ==========================================================
+    # WARMUP
+    # ==========================================================
+    def warmup(self):
+        """
+        Paga los costos de arranque fuera del camino de las peticiones: carga
+        del modelo + primer forward, y en cada conexión mínima del pool el
+        setup de sesión, el PREPARE de la KNN de contexto (la que usa /chat)
+        y las páginas del índice HNSW.
+        """
+        t0 = time.perf_counter()
+        emb = self.embed("warmup")
+
+        conns = []
+        try:
+            for _ in range(self.pool.minconn):
+                conn = self.pool.getconn()
+                conns.append(conn)
+                if not conn.ready:
+                    self._setup_connection(conn)
+                with conn.cursor() as cur:
+                    if emb is None:
+                        cur.execute("SELECT 1")
+                    else:
+                        self._execute_knn(cur, emb, 1, 1, with_metadata=True)
+                    cur.fetchall()
+        finally:
+            for conn in conns:
+                self.pool.putconn(conn, close=bool(conn.closed))
+
+        logger.info(f"🔥 Warmup RAG completo en {time.perf_counter() - t0:.2f}s ({len(conns)} conexiones).")
+
     def close(self):
+        self._embed_cache.clear()
+        self._search_cache.clear()
         try:
-            self.conn.close()
+            self.pool.closeall()
         except:
             pass
 
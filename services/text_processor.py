@@ -6,10 +6,177 @@ Diseñado para proteger el modelo, evitar prompts dañinos y estandarizar la ent
 
 import re
 import logging
-from typing import Dict, List
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Tuple
 
 logger = logging.getLogger("services.text_processor")
 
+# Patrones compilados una sola vez (sin lookup en la caché de `re` por llamada)
+# Caracteres de control invisibles (todos salvo \t, \n y \r)
+_CTRL_RE = re.compile(r"[\x00-\x08\x0B-\x0C\x0E-\x1F\x7F]")
+# Los mismos caracteres para la vía ASCII (bytes.translate), que además pasa
+# \r → \n: \r\n queda como \n\n y se colapsa igual que con replace()
+_CTRL_BYTES = bytes(range(0, 9)) + b"\x0b\x0c" + bytes(range(14, 32)) + b"\x7f"
+_ASCII_TRANS = bytes.maketrans(b"\r", b"\n")
+_BACKTICKS_RE = re.compile(r"`{2,}")
+_ANGLE_RE = re.compile(r"[<>]{2,}")
+# Corridas entre backticks: _compact_text las conserva (como "<<") porque
+# quitarlas crea "``" que la limpieza ya no colapsa
+_ANGLE_KEEP_RE = re.compile(r"(?<=`)[<>]{2,}(?=`)")
+_MULTISPACE_RE = re.compile(r" {2,}")
+_MULTINEWLINE_RE = re.compile(r"\n{2,}")
+_WORD_RE = re.compile(r"\w+")
+# Oración = tramo entre terminadores [.!?], ya sin espacios en los extremos
+# (equivale a split(r"[.!?]+") + strip() descartando vacíos, sin las copias)
+_SENTENCE_RE = re.compile(r"[^.!?\s](?:[^.!?]*[^.!?\s])?")
+
+# Palabras vacías para extract_keywords (constante: se construye una sola vez)
+_STOP_WORDS = frozenset({
+    'el','la','los','las','de','y','que','a','en','un','una','ser','se',
+    'por','con','su','para','como','estar','tener','lo','todo','pero',
+    'más','hacer','poder','decir','este','ese','eso','ir','si','ya',
+    'me','mi','tu','él','ella','ellos','ellas','nos','muy','sin','del',
+    'al','porque','cuando','aquí','allí','donde','sobre','entre','desde',
+    'hasta','cada','quien','cual','qué','quizá','aunque',
+    'también','además','durante','según','tras'
+})
+
+# Entradas procesadas recientes (saludos, respuestas rápidas, preguntas repetidas)
+PROCESS_CACHE_SIZE = 1024
+# Ventana máxima (caracteres crudos) del camino lento de process(): entradas
+# largas rellenas de espacios/control se recorren por tramos acotados
+SCAN_WINDOW_MAX = 1 << 16
+
+
+# ==========================================================
+#          PIPELINE PURO (función de texto + límites)
+# ==========================================================
+def _clean_text(text: str) -> str:
+    """
+    Elimina caracteres de control, normaliza saltos, protege estructura básica
+    y reduce espacios/saltos repetidos.
+
+    Cada reemplazo solo se ejecuta si su disparador aparece en el texto
+    (búsqueda de subcadena en C): una consulta normal se resuelve con una
+    sola pasada de regex + strip().
+    """
+    # Eliminar caracteres de control invisibles (excepto \t, \n, \r) y
+    # normalizar saltos a estándar UNIX
+    if text.isascii():
+        # Vía rápida: una sola pasada de tabla por byte, sin motor de regex
+        text = text.encode("ascii").translate(_ASCII_TRANS, _CTRL_BYTES).decode("ascii")
+    else:
+        text = _CTRL_RE.sub("", text)
+        if "\r" in text:
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+
+    # Evitar inyecciones accidentales de backticks u otros símbolos repetidos
+    if "``" in text:
+        text = _BACKTICKS_RE.sub("`", text)
+    if "<" in text or ">" in text:
+        text = _ANGLE_RE.sub("", text)
+
+    # Espacios repetidos y saltos excesivos (después de quitar "<<", que puede juntar espacios)
+    if "  " in text:
+        text = _MULTISPACE_RE.sub(" ", text)
+    if "\n\n" in text:
+        text = _MULTINEWLINE_RE.sub("\n", text)
+
+    return text.strip()
+
+
+def _compact_text(text: str, keep: int) -> str:
+    """
+    Forma compacta de un tramo crudo: _clean_text(_compact_text(x)) da el
+    mismo resultado que _clean_text(x) en los primeros keep - 1 caracteres
+    (y la misma clase de largo), y compactar por tramos equivale a compactar
+    todo junto. Corridas de blancos se acotan a keep caracteres.
+    """
+    if text.isascii():
+        text = text.encode("ascii").translate(_ASCII_TRANS, _CTRL_BYTES).decode("ascii")
+    else:
+        text = _CTRL_RE.sub("", text)
+        if "\r" in text:
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+
+    if "``" in text:
+        text = _BACKTICKS_RE.sub("`", text)
+    if "<" in text or ">" in text:
+        # La corrida final puede seguir en el próximo tramo: queda abierta
+        body = text.rstrip("<>")
+        tail = text[len(body):]
+        if len(tail) > 2:
+            tail = "<<"
+        if "`" in body:
+            # \x00 ya no puede aparecer (se quitó arriba): marca las corridas conservadas
+            body = _ANGLE_KEEP_RE.sub("\x00", body)
+        body = _ANGLE_RE.sub("", body)
+        if "\x00" in body:
+            body = body.replace("\x00", "<<")
+        text = body + tail
+    if "  " in text:
+        text = _MULTISPACE_RE.sub(" ", text)
+    if "\n\n" in text:
+        text = _MULTINEWLINE_RE.sub("\n", text)
+
+    if len(text) > keep:
+        text = re.sub(r"(\s{%d})\s+" % keep, r"\1", text)
+    return text
+
+
+def _finish(text: str, min_length: int, max_length: int) -> Tuple[str, int, bool]:
+    """
+    Truncado + cierre de frase sobre texto ya limpio. Devuelve (texto, largo
+    limpio, desborde); el llamador decide con el largo si quedó corto o truncado.
+    Un texto corto se devuelve limpio y sin cierre (como antes del caché).
+
+    `desborde` indica que tras max(max_length, min_length) queda algo no blanco
+    (sin contar el último carácter): el resultado no depende de lo que siga al
+    texto crudo.
+    """
+    clean_len = len(text)
+
+    if clean_len < min_length:
+        return text, clean_len, False
+
+    overflow = bool(text[max(max_length, min_length):-1].strip())
+    if clean_len > max_length:
+        text = text[:max_length]
+
+    # Cierre apropiado de frase, necesario para modelos (solo si falta el terminador)
+    if text and text[-1] not in ".!?":
+        text += "."
+
+    return text, clean_len, overflow
+
+
+@lru_cache(maxsize=PROCESS_CACHE_SIZE)
+def _process_cached(text: str, min_length: int, max_length: int) -> Tuple[str, int, bool]:
+    """Limpieza + _finish, cacheado (text nunca supera 2 * max_length)."""
+    return _finish(_clean_text(text), min_length, max_length)
+
+
+def _process_long(text: str, min_length: int, max_length: int) -> Tuple[str, int, bool]:
+    """
+    Camino lento (sin caché) para entradas largas cuyo recorte a 2 * max_length
+    no alcanza: relleno de espacios, control o "<<". Se compacta por ventanas
+    crecientes y se corta en cuanto el prefijo limpio queda fijo, así que solo
+    se recorre todo el texto si el relleno llega hasta el final.
+    """
+    keep = max(max_length, min_length) + 1
+    compact, pos, window = "", 0, max(max_length * 2, 1)
+    while pos < len(text):
+        compact = _compact_text(compact + text[pos:pos + window], keep)
+        pos += window
+        window = min(window * 2, max(SCAN_WINDOW_MAX, max_length * 2))
+
+        cleaned = _clean_text(compact)
+        if pos < len(text) and cleaned[keep - 1:-1].strip():
+            break
+
+    return _finish(cleaned, min_length, max_length)
+
 
 class TextProcessor:
     """
@@ -35,106 +202,52 @@ class TextProcessor:
             if not isinstance(text, str):
                 raise ValueError("Texto inválido: se esperaba un string.")
 
-            logger.debug(f"Texto original recibido ({len(text)} chars).")
+            logger.debug("Texto original recibido (%d chars).", len(text))
+
+            # Acotar el trabajo de limpieza a O(max_length) ante entradas enormes
+            # (margen x2 para lo que se pierde al colapsar espacios / quitar control).
+            # Si lo recortado podría cambiar el resultado (no hay desborde), se
+            # sigue leyendo por ventanas compactadas, fuera del caché
+            limit = self.max_length * 2
+            result, clean_len, overflow = _process_cached(text[:limit], self.min_length, self.max_length)
+            if len(text) > limit and not overflow:
+                result, clean_len, _ = _process_long(text, self.min_length, self.max_length)
+            text = result
 
-            text = self._clean_text(text)
-            text = self._normalize_spaces(text)
-            text = self._validate_length(text)
-            text = self._prepare_for_model(text)
+            if clean_len < self.min_length:
+                raise ValueError(f"Texto demasiado corto (mínimo {self.min_length} caracteres).")
+            if clean_len > self.max_length:
+                logger.warning("⚠️ Texto truncado a %d caracteres.", self.max_length)
 
-            logger.info(f"Texto procesado: {len(text)} chars.")
+            logger.info("Texto procesado: %d chars.", len(text))
             return text
 
         except Exception as e:
-            logger.error(f"❌ Error procesando texto: {str(e)} — devolviendo texto original.")
+            logger.error("❌ Error procesando texto: %s — devolviendo texto original.", e)
             return text
 
-    # ==========================================================
-    #                  MÉTODOS DE LIMPIEZA
-    # ==========================================================
-    def _clean_text(self, text: str) -> str:
-        """Elimina caracteres de control, normaliza saltos, protege estructura básica."""
-        
-        # Eliminar caracteres de control invisibles (excepto \n)
-        text = re.sub(r"[\x00-\x08\x0B-\x0C\x0E-\x1F\x7F]", "", text)
-
-        # Normalizar saltos a estándar UNIX
-        text = text.replace("\r\n", "\n").replace("\r", "\n")
-
-        # Evitar inyecciones accidentales de backticks u otros símbolos repetidos
-        text = re.sub(r"`{2,}", "`", text)
-        text = re.sub(r"[<>]{2,}", "", text)
-
-        return text.strip()
-
-    def _normalize_spaces(self, text: str) -> str:
-        """Reduce espacios múltiples y saltos excesivos."""
-        text = re.sub(r" +", " ", text)        # espacios repetidos
-        text = re.sub(r"\n{2,}", "\n", text)  # saltos excesivos
-        return text.strip()
-
-    # ==========================================================
-    #                  VALIDACIÓN DE LONGITUD
-    # ==========================================================
-    def _validate_length(self, text: str) -> str:
-        """Garantiza que el texto esté dentro del rango permitido."""
-        if len(text) < self.min_length:
-            raise ValueError(f"Texto demasiado corto (mínimo {self.min_length} caracteres).")
-
-        if len(text) > self.max_length:
-            logger.warning(f"⚠️ Texto truncado a {self.max_length} caracteres.")
-            return text[:self.max_length]
-
-        return text
-
-    # ==========================================================
-    #                  PREPARACIÓN PARA MODELO
-    # ==========================================================
-    def _prepare_for_model(self, text: str) -> str:
-        """Asegura cierre apropiado de frase, necesario para modelos."""
-        if text and text[-1] not in ".!?":
-            return text + "."
-        return text
-
     # ==========================================================
     #                  KEYWORDS (versión simple)
     # ==========================================================
     def extract_keywords(self, text: str, max_keywords: int = 5) -> List[str]:
         """Extrae palabras clave relevantes (sin librerías externas)."""
-
-        STOP_WORDS = {
-            'el','la','los','las','de','y','que','a','en','un','una','ser','se',
-            'por','con','su','para','como','estar','tener','lo','todo','pero',
-            'más','hacer','poder','decir','este','ese','eso','ir','si','ya',
-            'me','mi','tu','él','ella','ellos','ellas','nos','muy','sin','del',
-            'al','porque','cuando','aquí','allí','donde','sobre','entre','desde',
-            'hasta','cada','quien','cual','qué','cual','donde','quizá','aunque',
-            'también','además','durante','según','tras'
-        }
-
-        words = re.findall(r"\b\w+\b", text.lower())
-        valid = [w for w in words if w not in STOP_WORDS and len(w) > 3]
-
-        freq = {}
-        for w in valid:
-            freq[w] = freq.get(w, 0) + 1
-
-        sorted_words = sorted(freq.items(), key=lambda x: x[1], reverse=True)
-
-        return [w for w, _ in sorted_words[:max_keywords]]
+        # Counter consume el filtro directamente (sin lista intermedia de válidas).
+        # most_common usa heapq.nlargest (estable: empates en orden de aparición)
+        valid = (w for w in _WORD_RE.findall(text.lower()) if w not in _STOP_WORDS and len(w) > 3)
+        return [w for w, _ in Counter(valid).most_common(max_keywords)]
 
     # ==========================================================
     #                  ESTADÍSTICAS DEL TEXTO
     # ==========================================================
     def get_statistics(self, text: str) -> Dict:
         """Obtiene estadísticas básicas sobre el texto."""
-        words = re.findall(r"\b\w+\b", text)
-        sentences = [s.strip() for s in re.split(r"[.!?]+", text) if s.strip()]
+        words = _WORD_RE.findall(text)
+        sentences = _SENTENCE_RE.findall(text)
 
         return {
             "char_count": len(text),
             "word_count": len(words),
             "sentence_count": len(sentences),
-            "avg_word_length": sum(len(w) for w in words) / len(words) if words else 0,
-            "avg_sentence_length": sum(len(s) for s in sentences) / len(sentences) if sentences else 0,
+            "avg_word_length": sum(map(len, words)) / len(words) if words else 0,
+            "avg_sentence_length": sum(map(len, sentences)) / len(sentences) if sentences else 0,
         }
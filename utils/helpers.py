@@ -5,11 +5,23 @@ Utilidades generales para el sistema
 
 import re
 import logging
+import traceback
 from typing import Dict, Any, Optional
-from datetime import datetime
+from time import gmtime, strftime
 
 logger = logging.getLogger(__name__)
 
+# Timestamp ISO-8601 en UTC con precisión de segundos (sin construir un datetime)
+_ISO_UTC_FMT = "%Y-%m-%dT%H:%M:%SZ"
+
+# Caracteres de control C0 + DEL + C1. str.translate solo es rápido con texto
+# ASCII; con acentos/ñ la clase de caracteres compilada es varias veces más rápida.
+_CTRL_TRANS = dict.fromkeys([*range(0, 32), *range(127, 160)], None)
+_CTRL_RE = re.compile(r'[\x00-\x1f\x7f-\x9f]')
+
+# Subcadenas peligrosas (básico): literales en minúsculas, se buscan con `in`
+_DANGEROUS_NEEDLES = ("<script", "javascript:", "onerror=", "onload=")
+
 def validate_input(text: str, min_length: int = 3, max_length: int = 500):
     """
     Validar input del usuario
@@ -34,16 +46,9 @@ def validate_input(text: str, min_length: int = 3, max_length: int = 500):
         return False, f"Input muy largo. Máximo {max_length} caracteres"
     
     # Validar caracteres peligrosos (básico)
-    dangerous_patterns = [
-        r'<script',
-        r'javascript:',
-        r'onerror=',
-        r'onload='
-    ]
-    
-    for pattern in dangerous_patterns:
-        if re.search(pattern, text, re.IGNORECASE):
-            return False, "Input contiene caracteres no permitidos"
+    low = text.lower()
+    if any(needle in low for needle in _DANGEROUS_NEEDLES):
+        return False, "Input contiene caracteres no permitidos"
     
     return True, None
 
@@ -61,7 +66,7 @@ def format_response(data: Dict[str, Any], status: str = 'success') -> Dict[str,
     return {
         'status': status,
         'data': data,
-        'timestamp': datetime.now().isoformat(),
+        'timestamp': strftime(_ISO_UTC_FMT, gmtime()),
         'version': '1.0.0'
     }
 
@@ -102,12 +107,15 @@ def sanitize_text(text: str) -> str:
     Returns:
         Texto sanitizado
     """
-    # Remover caracteres de control
-    text = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', text)
-    
-    # Limitar longitud
+    # Limitar longitud primero: la limpieza solo recorre lo que se va a devolver
     text = text[:1000]
     
+    # Remover caracteres de control
+    if text.isascii():
+        text = text.translate(_CTRL_TRANS)
+    else:
+        text = _CTRL_RE.sub('', text)
+    
     return text.strip()
 
 def format_error(error: Exception, include_traceback: bool = False) -> Dict[str, Any]:
@@ -124,12 +132,13 @@ def format_error(error: Exception, include_traceback: bool = False) -> Dict[str,
     error_info = {
         'error': str(error),
         'type': type(error).__name__,
-        'timestamp': datetime.now().isoformat()
+        'timestamp': strftime(_ISO_UTC_FMT, gmtime())
     }
     
     if include_traceback:
-        import traceback
-        error_info['traceback'] = traceback.format_exc()
+        # Formatea la excepción recibida (no la "actual" de sys.exc_info)
+        tb = traceback.TracebackException.from_exception(error)
+        error_info['traceback'] = ''.join(tb.format())
     
     return error_info
 